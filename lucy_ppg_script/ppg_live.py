@@ -1,49 +1,240 @@
 import serial
+import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+import array
 import datetime
+import errno
 import os
+import queue
+import signal
+import sys
 import time
 import threading
-import csv
-from matplotlib.animation import FuncAnimation
 
-# Global variables for data
-timestamps = []
-sensor1_values = []
-sensor2_values = []
+# io_uring-backed disk writes are optional (Linux only); without liburing
+# the reader falls back to plain buffered writes
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+# pyqtgraph renders the live view through OpenGL at much higher frame
+# rates than Agg; without it the matplotlib blitting view is used
+try:
+    import pyqtgraph as pg
+except ImportError:
+    pg = None
+
+# Ring buffer capacity (samples); at 100 Hz this holds several hours of data
+BUFFER_CAPACITY = 1_000_000
+
+# Number of most recent samples shown in the live plot
+DISPLAY_LIMIT = 500
+
+# Extra headroom (in data units) kept around the y-limits so the axes only
+# need rescaling when the signal actually drifts out of the current view
+AXIS_MARGIN = 50
+
+# Number of samples accumulated before the CSV rows are written out in one
+# batched write (~0.64 s of data at 100 Hz)
+CSV_BATCH_SIZE = 64
+
+# Record layout of the binary companion file saved on exit; pwv_script
+# memory-maps files with this dtype instead of parsing CSV
+PPG_RECORD_DTYPE = np.dtype([('timestamp_ms', '<i4'),
+                             ('ppg1', '<i2'),
+                             ('ppg2', '<i2')])
+
+# Single-producer/single-consumer ring buffer shared between the serial
+# thread (producer) and the animation callback (consumer). Each slot holds
+# one (timestamp, sensor1, sensor2) sample. The head/tail counters are
+# single-word stores in array('Q') cells, which the GIL makes atomic, so no
+# lock is needed: the producer only writes head, the consumer only writes
+# tail, and the producer always fills a slot before publishing it via head.
+sample_buffer = np.empty((BUFFER_CAPACITY, 3), dtype=np.int32)
+buffer_head = array.array('Q', [0])
+buffer_tail = array.array('Q', [0])
 recording = True
-csv_writer = None
 csv_file = None
 
+def _recent_data(limit):
+    """Return the most recent samples (up to limit) in arrival order"""
+    head = buffer_head[0]
+    start = max(0, head - limit)
+    samples = np.take(sample_buffer, np.arange(start, head) % BUFFER_CAPACITY,
+                      axis=0)
+    buffer_tail[0] = head
+    return samples[:, 0], samples[:, 1], samples[:, 2]
+
+# Sample count at the last drawn frame, used to skip no-op redraws
+last_drawn_count = 0
+
+def _frame_data():
+    """Return display data for a new frame, or None if nothing changed.
+
+    Frames without new samples are skipped entirely (e.g. while the
+    Arduino is between collections), and frames with a large backlog are
+    decimated 2:1 — indistinguishable at this point density but half the
+    vertices to render.
+    """
+    global last_drawn_count
+    head = buffer_head[0]
+    if head == 0 or head == last_drawn_count:
+        return None
+    new_samples = head - last_drawn_count
+    last_drawn_count = head
+
+    x_data, y1_data, y2_data = _recent_data(DISPLAY_LIMIT)
+    if new_samples > 50:
+        return x_data[::2], y1_data[::2], y2_data[::2]
+    return x_data, y1_data, y2_data
+
+class BlitManager:
+    """Manual blitting helper (matplotlib blitting how-to pattern).
+
+    Caches the static figure background once and, per update, restores
+    it, redraws only the animated artists, and blits the result, instead
+    of compositing the whole figure every frame.
+    """
+
+    def __init__(self, canvas, animated_artists=()):
+        self.canvas = canvas
+        self._background = None
+        self._artists = list(animated_artists)
+        for artist in self._artists:
+            artist.set_animated(True)
+        # Re-grab the background whenever the figure is fully redrawn
+        # (first draw, window resize, or an axis-limit change)
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        if event is not None and event.canvas is not self.canvas:
+            return
+        self._background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        """Restore the cached background, redraw the artists, and blit"""
+        if self._background is None:
+            self._on_draw(None)
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self._background)
+            self._draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
+def _io_uring_writer(fd, offset, chunk_queue):
+    """Drain queued CSV chunks and write them to fd through an io_uring.
+
+    Runs on a daemon thread so the serial reader only pays a queue.put per
+    batch and never blocks on write(2). A None chunk shuts the thread down.
+    """
+    ring = liburing.io_uring()
+    cqe = liburing.io_uring_cqe()
+    liburing.io_uring_queue_init(64, ring, 0)
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is None:
+                break
+            view = memoryview(bytearray(chunk))
+            while len(view) > 0:
+                if ring is None:
+                    # The ring failed earlier; plain positional write(2)
+                    written = os.pwrite(fd, view, offset)
+                else:
+                    sqe = liburing.io_uring_get_sqe(ring)
+                    liburing.io_uring_prep_write(sqe, fd, view, len(view), offset)
+                    liburing.io_uring_submit(ring)
+                    # Wait for the completion so the buffer stays alive
+                    # until the kernel has consumed it
+                    liburing.io_uring_wait_cqe(ring, cqe)
+                    written = cqe.res
+                    liburing.io_uring_cqe_seen(ring, cqe)
+                    if written == -errno.EINTR or written == -errno.EAGAIN:
+                        # Transient; resubmit the same range
+                        continue
+                    if written < 0:
+                        # Persistent error: surface it and finish this
+                        # chunk (and all later ones) with plain writes
+                        print("io_uring write failed "
+                              f"({os.strerror(-written)}); "
+                              "falling back to plain writes")
+                        liburing.io_uring_queue_exit(ring)
+                        ring = None
+                        continue
+                # Advance past what was written; a short write leaves the
+                # remainder in view for the next submission
+                offset += written
+                view = view[written:]
+    finally:
+        if ring is not None:
+            liburing.io_uring_queue_exit(ring)
+
 def read_serial_data(ser, csv_path):
     """Thread function to continuously read data from serial port"""
-    global timestamps, sensor1_values, sensor2_values, recording, csv_writer, csv_file
-    
-    # Create and open CSV file
-    csv_file = open(csv_path, 'w', newline='')
-    csv_writer = csv.writer(csv_file)
-    csv_writer.writerow(["timestamp", "sensor1", "sensor2"])
-    
+    global recording, csv_file
+
+    # Create and open CSV file with a large write buffer; rows are batched
+    # in memory and written out CSV_BATCH_SIZE at a time so the hot loop
+    # does one buffered write per batch instead of one per sample
+    csv_file = open(csv_path, 'w', buffering=1 << 16, newline='')
+    csv_file.write("timestamp,sensor1,sensor2\n")
+    pending_rows = []
+
+    # On Linux with liburing available, hand completed batches to an
+    # io_uring writer thread so the serial loop never blocks on write(2)
+    write_queue = None
+    writer_thread = None
+    if liburing is not None and sys.platform.startswith('linux'):
+        csv_file.flush()
+        write_queue = queue.Queue()
+        writer_thread = threading.Thread(
+            target=_io_uring_writer,
+            args=(csv_file.fileno(), csv_file.tell(), write_queue))
+        writer_thread.daemon = True
+        writer_thread.start()
+
+    def flush_rows():
+        chunk = "".join(pending_rows)
+        if write_queue is not None:
+            write_queue.put(chunk.encode('ascii'))
+        else:
+            csv_file.write(chunk)
+        pending_rows.clear()
+
     print("Reading data from Arduino...")
     
     try:
         while recording:
-            line = ser.readline().decode('utf-8').strip()
-            
-            # Parse data (timestamp,sensor1,sensor2)
+            # Parse the raw bytes directly (timestamp,sensor1,sensor2);
+            # int() accepts bytes and skips surrounding whitespace, so the
+            # per-sample decode('utf-8')/strip() round-trip is unnecessary
+            line = ser.readline()
+
             try:
-                parts = line.split(',')
+                parts = line.split(b',')
                 if len(parts) == 3:
                     timestamp, sensor1, sensor2 = map(int, parts)
-                    
-                    # Add to global data lists
-                    timestamps.append(timestamp)
-                    sensor1_values.append(sensor1)
-                    sensor2_values.append(sensor2)
-                    
-                    # Write to CSV file
-                    csv_writer.writerow([timestamp, sensor1, sensor2])
+
+                    # Fill the slot first, then publish it with a single
+                    # store to head so the consumer never sees a
+                    # half-written sample
+                    head = buffer_head[0]
+                    sample_buffer[head % BUFFER_CAPACITY] = (
+                        timestamp, sensor1, sensor2)
+                    buffer_head[0] = head + 1
+
+                    # Queue the CSV row; flushed in batches
+                    pending_rows.append(f"{timestamp},{sensor1},{sensor2}\n")
+                    if len(pending_rows) >= CSV_BATCH_SIZE:
+                        flush_rows()
             except ValueError:
                 # Skip lines that can't be parsed
                 pass
@@ -51,39 +242,125 @@ def read_serial_data(ser, csv_path):
         print(f"Error in serial reading thread: {e}")
     finally:
         if csv_file and not csv_file.closed:
+            # Write out any partial batch and make sure it reaches disk
+            if pending_rows:
+                flush_rows()
+            if writer_thread is not None:
+                write_queue.put(None)
+                writer_thread.join()
+            csv_file.flush()
+            os.fsync(csv_file.fileno())
             csv_file.close()
             print(f"CSV file closed")
 
-def update_plot(frame, line1, line2, ax):
-    """Update function for animation"""
-    # Update line data
-    if len(timestamps) > 0:
-        # Only show the last 500 points for better visualization
-        display_limit = 500
-        
-        if len(timestamps) <= display_limit:
-            x_data = timestamps
-            y1_data = sensor1_values
-            y2_data = sensor2_values
-        else:
-            x_data = timestamps[-display_limit:]
-            y1_data = sensor1_values[-display_limit:]
-            y2_data = sensor2_values[-display_limit:]
-        
-        line1.set_data(x_data, y1_data)
-        line2.set_data(x_data, y2_data)
-        
-        # Adjust x-axis limit to show only recent data
-        ax.set_xlim(min(x_data), max(x_data))
-        
-        # Adjust y-axis limits if needed
-        all_y = y1_data + y2_data
-        if all_y:
-            y_min = min(all_y) - 50
-            y_max = max(all_y) + 50
-            ax.set_ylim(y_min, y_max)
-    
-    return line1, line2
+def update_plot(line1, line2, ax, blit_manager):
+    """Push the latest samples to the plot and blit the changed artists"""
+    # Only show the most recent points for better visualization
+    frame = _frame_data()
+    if frame is None:
+        # No new samples since the last draw; just keep the GUI responsive
+        blit_manager.canvas.flush_events()
+        return
+
+    x_data, y1_data, y2_data = frame
+
+    line1.set_data(x_data, y1_data)
+    line2.set_data(x_data, y2_data)
+
+    # Only touch the axis limits when data falls outside the current
+    # view; every set_xlim/set_ylim forces a full redraw and defeats
+    # blitting, so limits are given headroom and left alone otherwise
+    limits_changed = False
+
+    x_min, x_max = int(x_data[0]), int(x_data[-1])
+    cur_xmin, cur_xmax = ax.get_xlim()
+    if x_min < cur_xmin or x_max > cur_xmax:
+        ax.set_xlim(x_min, x_max + max(1, (x_max - x_min) // 4))
+        limits_changed = True
+
+    y_min = int(min(y1_data.min(), y2_data.min()))
+    y_max = int(max(y1_data.max(), y2_data.max()))
+    cur_ymin, cur_ymax = ax.get_ylim()
+    if y_min < cur_ymin + AXIS_MARGIN or y_max > cur_ymax - AXIS_MARGIN:
+        ax.set_ylim(y_min - 2 * AXIS_MARGIN, y_max + 2 * AXIS_MARGIN)
+        limits_changed = True
+
+    if limits_changed:
+        # Ticks and background need a full redraw; the draw event
+        # makes the blit manager re-cache its background
+        ax.figure.canvas.draw_idle()
+
+    blit_manager.update()
+
+def save_binary(bin_path):
+    """Dump the recorded samples as packed PPG_RECORD_DTYPE records"""
+    head = buffer_head[0]
+    start = max(0, head - BUFFER_CAPACITY)
+    samples = np.take(sample_buffer, np.arange(start, head) % BUFFER_CAPACITY,
+                      axis=0)
+    records = np.empty(len(samples), dtype=PPG_RECORD_DTYPE)
+    records['timestamp_ms'] = samples[:, 0]
+    records['ppg1'] = samples[:, 1]
+    records['ppg2'] = samples[:, 2]
+    records.tofile(bin_path)
+
+def run_live_view_pyqtgraph():
+    """Show the live plot in a pyqtgraph window until it is closed"""
+    app = pg.mkQApp("PPG Sensor Readings (Live)")
+    plot = pg.PlotWidget(title='PPG Sensor Readings (Live)')
+    plot.setLabel('bottom', 'Time (milliseconds)')
+    plot.setLabel('left', 'Analog Reading')
+    plot.showGrid(x=True, y=True)
+    plot.addLegend()
+    curve1 = plot.plot(pen='y', name='Sensor 1 (A1)')
+    curve2 = plot.plot(pen='c', name='Sensor 2 (A2)')
+    plot.show()
+
+    def update():
+        frame = _frame_data()
+        if frame is not None:
+            x_data, y1_data, y2_data = frame
+            curve1.setData(x_data, y1_data)
+            curve2.setData(x_data, y2_data)
+
+    timer = pg.QtCore.QTimer()
+    timer.timeout.connect(update)
+    timer.start(100)
+
+    # Ctrl+C must end this view the same way it ends the matplotlib one.
+    # Without a handler the KeyboardInterrupt is raised inside the timer
+    # slot, where Qt aborts instead of unwinding to main's cleanup, so
+    # route SIGINT to app.quit() (the 100 ms timer guarantees the Python
+    # handler gets to run) and let exec() return normally.
+    previous_handler = signal.signal(signal.SIGINT, lambda *_: app.quit())
+    try:
+        app.exec()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
+def run_live_view_matplotlib():
+    """Show the live plot with matplotlib blitting until it is closed"""
+    plt.ion()  # Enable interactive mode
+    fig, ax = plt.subplots(figsize=(12, 6))
+    line1, = ax.plot([], [], label='Sensor 1 (A1)')
+    line2, = ax.plot([], [], label='Sensor 2 (A2)')
+
+    ax.set_title('PPG Sensor Readings (Live)')
+    ax.set_xlabel('Time (milliseconds)')
+    ax.set_ylabel('Analog Reading')
+    ax.legend()
+    ax.grid(True)
+
+    # Set up manual blitting: one cached background, only the two
+    # lines are redrawn per update
+    plt.show(block=False)
+    fig.canvas.draw()
+    blit_manager = BlitManager(fig.canvas, (line1, line2))
+
+    # Update loop; runs until the window is closed or Ctrl+C
+    while plt.fignum_exists(fig.number):
+        update_plot(line1, line2, ax, blit_manager)
+        time.sleep(0.1)
 
 def main():
     global recording
@@ -98,6 +375,7 @@ def main():
     timestamp_str = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     csv_path = f"{args.output}_{timestamp_str}.csv"
     png_path = f"{args.output}_{timestamp_str}.png"
+    bin_path = f"{args.output}_{timestamp_str}.bin"
     
     try:
         # Connect to Arduino
@@ -108,8 +386,8 @@ def main():
         # Wait for start signal
         print("Waiting for Arduino to start data collection...")
         while True:
-            line = ser.readline().decode('utf-8').strip()
-            if line == "START_RECORDING":
+            line = ser.readline()
+            if line.strip() == b"START_RECORDING":
                 print("Data collection started")
                 break
         
@@ -118,36 +396,21 @@ def main():
         serial_thread.daemon = True
         serial_thread.start()
         
-        # Set up the plot
-        plt.ion()  # Enable interactive mode
-        fig, ax = plt.subplots(figsize=(12, 6))
-        line1, = ax.plot([], [], label='Sensor 1 (A1)')
-        line2, = ax.plot([], [], label='Sensor 2 (A2)')
-        
-        ax.set_title('PPG Sensor Readings (Live)')
-        ax.set_xlabel('Time (milliseconds)')
-        ax.set_ylabel('Analog Reading')
-        ax.legend()
-        ax.grid(True)
-        
-        # Set up the animation
-        ani = FuncAnimation(fig, update_plot, fargs=(line1, line2, ax), 
-                          interval=100, blit=True)
-        
         print("Live plotting started. Press Ctrl+C to stop recording.")
         print(f"Data is being saved to {csv_path}")
         print("Plot will be saved upon exit.")
-        
-        # Show the plot (this will block until the plot window is closed)
-        plt.show()
-        
-        # Handle user termination
+
+        # GPU-accelerated view when pyqtgraph is available; matplotlib
+        # blitting otherwise. Matplotlib is still used either way for the
+        # final PNG snapshot on exit.
         try:
-            while True:
-                plt.pause(0.1)  # Small pause to allow GUI to update
+            if pg is not None:
+                run_live_view_pyqtgraph()
+            else:
+                run_live_view_matplotlib()
         except KeyboardInterrupt:
             print("\nRecording stopped by user")
-        
+
     except serial.SerialException as e:
         print(f"Error: {e}")
     except Exception as e:
@@ -165,11 +428,18 @@ def main():
             ser.close()
             print("Serial connection closed")
         
+        # Save the binary companion file; pwv_script memory-maps it
+        # instead of re-parsing the CSV
+        if buffer_head[0] > 0:
+            save_binary(bin_path)
+            print(f"Binary data saved as {bin_path}")
+
         # Save the final plot
-        if len(timestamps) > 0:
+        if buffer_head[0] > 0:
+            x_data, y1_data, y2_data = _recent_data(BUFFER_CAPACITY)
             plt.figure(figsize=(12, 6))
-            plt.plot(timestamps, sensor1_values, label='Sensor 1 (A1)')
-            plt.plot(timestamps, sensor2_values, label='Sensor 2 (A2)')
+            plt.plot(x_data, y1_data, label='Sensor 1 (A1)')
+            plt.plot(x_data, y2_data, label='Sensor 2 (A2)')
             plt.title('PPG Sensor Readings')
             plt.xlabel('Time (milliseconds)')
             plt.ylabel('Analog Reading')
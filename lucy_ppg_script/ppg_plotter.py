@@ -1,10 +1,86 @@
 import serial
+import numpy as np
 import matplotlib.pyplot as plt
 import argparse
 import datetime
 import os
 import time
 
+# numba is optional; with it the serial blocks are tokenized by compiled
+# code, without it an equivalent bytes-level parser is used
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Initial sample capacity; arrays double when a recording outgrows it
+INITIAL_CAPACITY = 200_000
+
+if njit is not None:
+    @njit(cache=True)
+    def parse_block(block, timestamps, sensor1, sensor2, count):
+        """Parse complete 'ts,s1,s2' lines from block into the arrays.
+
+        Digits are accumulated manually so no Python objects are created
+        per sample. Malformed lines are skipped. Returns the new count.
+        """
+        n = count
+        value = 0
+        field0 = 0
+        field1 = 0
+        field_idx = 0
+        has_digits = False
+        valid = True
+        for k in range(len(block)):
+            c = block[k]
+            if 48 <= c <= 57:  # '0'..'9'
+                value = value * 10 + (c - 48)
+                has_digits = True
+            elif c == 44:  # ','
+                if not has_digits:
+                    valid = False
+                elif field_idx == 0:
+                    field0 = value
+                elif field_idx == 1:
+                    field1 = value
+                else:
+                    valid = False
+                field_idx += 1
+                value = 0
+                has_digits = False
+            elif c == 10:  # '\n'
+                if (valid and has_digits and field_idx == 2
+                        and n < timestamps.shape[0]):
+                    timestamps[n] = field0
+                    sensor1[n] = field1
+                    sensor2[n] = value
+                    n += 1
+                value = 0
+                field0 = 0
+                field1 = 0
+                field_idx = 0
+                has_digits = False
+                valid = True
+            elif c != 13:  # anything but '\r' invalidates the line
+                valid = False
+        return n
+else:
+    def parse_block(block, timestamps, sensor1, sensor2, count):
+        """Bytes-level fallback parser with the same contract"""
+        n = count
+        for line in block.split(b'\n'):
+            parts = line.split(b',')
+            if len(parts) == 3 and n < timestamps.shape[0]:
+                try:
+                    ts, s1, s2 = map(int, parts)
+                except ValueError:
+                    continue
+                timestamps[n] = ts
+                sensor1[n] = s1
+                sensor2[n] = s2
+                n += 1
+        return n
+
 def main():
     parser = argparse.ArgumentParser(description='Record PPG data and save plot as image')
     parser.add_argument('--port', type=str, required=True, help='Serial port (e.g., COM3 on Windows or /dev/ttyUSB0 on Linux/Mac)')
@@ -21,37 +97,54 @@ def main():
         # Wait for start signal
         print("Waiting for Arduino to start data collection...")
         while True:
-            line = ser.readline().decode('utf-8').strip()
-            if line == "START_RECORDING":
+            line = ser.readline()
+            if line.strip() == b"START_RECORDING":
                 print("Data collection started")
                 break
-        
-        # Collect data
-        timestamps = []
-        sensor1_values = []
-        sensor2_values = []
-        
+
+        # Collect data into preallocated arrays; the serial port is read
+        # in blocks and complete lines are handed to the block parser
+        timestamps = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        sensor1_values = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        sensor2_values = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        count = 0
+        remainder = b""
+
         print("Recording data...")
-        while True:
-            line = ser.readline().decode('utf-8').strip()
-            
+        finished = False
+        while not finished:
+            chunk = ser.read(max(1, ser.in_waiting))
+            if not chunk:
+                continue
+            buffered = remainder + chunk
+            newline = buffered.rfind(b'\n')
+            if newline < 0:
+                # No complete line yet; keep accumulating
+                remainder = buffered
+                continue
+            block = buffered[:newline + 1]
+            remainder = buffered[newline + 1:]
+
             # Check for end signal
-            if line == "END_RECORDING":
-                print("Data collection completed")
-                break
-                
-            # Parse data (timestamp,sensor1,sensor2)
-            try:
-                parts = line.split(',')
-                if len(parts) == 3:
-                    timestamp, sensor1, sensor2 = map(int, parts)
-                    timestamps.append(timestamp)
-                    sensor1_values.append(sensor1)
-                    sensor2_values.append(sensor2)
-            except ValueError:
-                # Skip lines that can't be parsed
-                pass
-        
+            end_marker = block.find(b"END_RECORDING")
+            if end_marker >= 0:
+                block = block[:end_marker]
+                finished = True
+
+            # Grow the arrays if the recording outlives the initial guess
+            while count + block.count(b'\n') > len(timestamps):
+                timestamps = np.resize(timestamps, 2 * len(timestamps))
+                sensor1_values = np.resize(sensor1_values, len(timestamps))
+                sensor2_values = np.resize(sensor2_values, len(timestamps))
+
+            count = parse_block(block, timestamps,
+                                sensor1_values, sensor2_values, count)
+
+        print("Data collection completed")
+        timestamps = timestamps[:count]
+        sensor1_values = sensor1_values[:count]
+        sensor2_values = sensor2_values[:count]
+
         # Create plot
         plt.figure(figsize=(12, 6))
         plt.plot(timestamps, sensor1_values, label='Sensor 1 (A1)')
@@ -6,24 +6,164 @@ detects peaks using scipy, calculates PTT, and saves plots to a folder.
 
 import serial
 import time
+import io
 import numpy as np
-import pandas as pd
+from scipy.ndimage import uniform_filter1d
 from scipy.signal import find_peaks
+import matplotlib
+matplotlib.use("Agg")  # plots are written to files, never shown
 import matplotlib.pyplot as plt
 import serial.tools.list_ports
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# numba is optional; with it each serial line is tokenized and stored
+# by compiled code, without it an equivalent bytes-level path is used
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def ingest(line, ts, p1, p2, n):
+        """Parse a b'ts,ppg1,ppg2' line and store it at index n of the
+        sample buffers, without creating any intermediate Python
+        objects. Returns the new count, or -1 if the line is malformed."""
+        f0 = 0
+        f1 = 0
+        value = 0
+        sign = 1
+        field_idx = 0
+        has_digits = False
+        for k in range(len(line)):
+            c = line[k]
+            if 48 <= c <= 57:  # '0'..'9'
+                value = value * 10 + (c - 48)
+                has_digits = True
+            elif c == 45:  # '-', only valid at the start of a field
+                if has_digits or sign < 0:
+                    return -1
+                sign = -1
+            elif c == 44:  # ','
+                if not has_digits or field_idx > 1:
+                    return -1
+                if field_idx == 0:
+                    f0 = sign * value
+                else:
+                    f1 = sign * value
+                field_idx += 1
+                value = 0
+                sign = 1
+                has_digits = False
+            elif c == 13 or c == 10:  # trailing '\r' / '\n'
+                break
+            else:
+                return -1
+        if field_idx == 2 and has_digits:
+            ts[n] = f0
+            p1[n] = f1
+            p2[n] = sign * value
+            return n + 1
+        return -1
+else:
+    def ingest(line, ts, p1, p2, n):
+        """Bytes-level fallback with the same contract"""
+        parts = line.split(b',')
+        if len(parts) == 3:
+            try:
+                ts[n], p1[n], p2[n] = map(int, parts)
+            except ValueError:
+                return -1
+            return n + 1
+        return -1
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def pair_and_filter(ts, p1, p2):
+        """Pair corresponding peaks and keep the transit times in the
+        valid (0, 300) ms range, in one compiled pass"""
+        k = min(p1.size, p2.size)
+        out = np.empty(k, dtype=np.int64)
+        n = 0
+        for i in range(k):
+            d = ts[p2[i]] - ts[p1[i]]
+            if d < 0:
+                d = -d
+            if 0 < d < 300:
+                out[n] = d
+                n += 1
+        return out[:n]
+else:
+    def pair_and_filter(ts, p1, p2):
+        """Vectorized fallback with the same contract"""
+        k = min(p1.size, p2.size)
+        diffs = np.abs(ts[p2[:k]].astype(np.int64) - ts[p1[:k]].astype(np.int64))
+        return diffs[(diffs > 0) & (diffs < 300)]
+
+def _moving_mean(x, window_size):
+    """O(n) moving average, equivalent to
+    np.convolve(x, np.ones(window_size)/window_size, mode='valid').
+
+    scipy's uniform filter runs a single C pass independent of window
+    size; the origin shift and trailing trim reproduce the 'valid'
+    alignment. float32 in and out halves the bandwidth of the peak
+    scan downstream."""
+    n = len(x)
+    if n < window_size:
+        return np.empty(0, dtype=np.float32)
+    filtered = uniform_filter1d(x.astype(np.float32), size=window_size,
+                                origin=-(window_size // 2))
+    return filtered[:n - window_size + 1]
+
+# Initial sample capacity per collection; buffers double if outgrown
+BUFFER_CAPACITY = 200_000
+
+def _thin(a, max_points=2000):
+    """Stride-thin an array for plotting; the line renderer's cost is
+    per point drawn and ~2000 points fill a figure-width axis"""
+    a = np.asarray(a)
+    if a.size <= max_points:
+        return a
+    return a[::a.size // max_points]
+
+def _report_error(future):
+    exc = future.exception()
+    if exc is not None:
+        print(f"Error processing collection: {exc}")
+
 class PTTCalculator:
     def __init__(self, output_folder="ptt_plots"):
         self.ser = None
-        self.ppg1_data = []
-        self.ppg2_data = []
-        self.timestamps = []
-        self.ptt_values = []
-        self.all_ptt_values = []  # For storing all PTT values across sessions
+        # Preallocated typed sample buffers with a shared write index;
+        # samples are stored in place instead of appended to lists
+        self.ppg1_data = np.empty(BUFFER_CAPACITY, dtype=np.int32)
+        self.ppg2_data = np.empty(BUFFER_CAPACITY, dtype=np.int32)
+        self.timestamps = np.empty(BUFFER_CAPACITY, dtype=np.int32)
+        self.n = 0
+        self.ptt_values = np.empty(0, dtype=np.int32)
+        # All PTT values collected across the session
+        self.all_ptt_values = np.empty(0, dtype=np.int32)
         self.is_collecting = False
         self.collection_count = 0
+        # Running Welford accumulators over the session's PTT values;
+        # session mean/std come out in O(1) instead of re-scanning the
+        # ever-growing all_ptt_values array
+        self._stat_n = 0
+        self._stat_mean = 0.0
+        self._stat_m2 = 0.0
+        # Incremental histogram of the session's PTT values; valid PTTs
+        # are integers in (0, 300) ms, one count bin per millisecond
+        self._hist = np.zeros(301, dtype=np.int64)
+        # One figure reused for every plot; each save clears it and
+        # draws fresh subplots instead of allocating a new canvas
+        self._fig = plt.figure(figsize=(10, 12))
+        # Single worker that runs process_data off the serial hot path;
+        # one worker keeps the collections processed in order
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._stats_lock = threading.Lock()
         
         # Create output folder if it doesn't exist
         self.output_folder = output_folder
@@ -38,63 +178,61 @@ class PTTCalculator:
         
         port = input("Enter the Arduino port name (e.g. COM3 or /dev/ttyACM0): ")
         try:
-            self.ser = serial.Serial(port, 115200)
+            # A short timeout bounds each raw read so the buffered
+            # reader hands back whatever has arrived instead of
+            # blocking for a full buffer
+            self.ser = serial.Serial(port, 115200, timeout=0.05)
             print(f"Connected to Arduino on {port}")
             return True
         except serial.SerialException as e:
             print(f"Error connecting to Arduino: {e}")
             return False
 
-    def process_data(self):
-        """Process the collected data to find peaks and calculate PTT"""
-        if len(self.ppg1_data) < 50 or len(self.ppg2_data) < 50:
+    def process_data(self, timestamps, ppg1, ppg2):
+        """Process one collection's samples to find peaks and calculate
+        PTT; runs on the worker thread"""
+        if len(timestamps) < 50:
             print("Not enough data points collected")
             return
-        
+
         self.collection_count += 1
         timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename_base = f"collection_{timestamp_str}"
         
-        # Convert data to numpy arrays
-        timestamps = np.array(self.timestamps)
-        ppg1 = np.array(self.ppg1_data)
-        ppg2 = np.array(self.ppg2_data)
-        
         # Apply basic filtering (moving average) to smooth the signals
         window_size = 5
-        ppg1_filtered = np.convolve(ppg1, np.ones(window_size)/window_size, mode='valid')
-        ppg2_filtered = np.convolve(ppg2, np.ones(window_size)/window_size, mode='valid')
+        ppg1_filtered = _moving_mean(ppg1, window_size)
+        ppg2_filtered = _moving_mean(ppg2, window_size)
         timestamps_filtered = timestamps[window_size-1:]
         
-        # Find peaks in both signals
+        # Find peaks in both signals, with the mean height thresholds
+        # reduced to plain floats up front
         # Adjust these parameters based on your specific signal characteristics
-        ppg1_peaks, _ = find_peaks(ppg1_filtered, height=np.mean(ppg1_filtered), distance=30)
-        ppg2_peaks, _ = find_peaks(ppg2_filtered, height=np.mean(ppg2_filtered), distance=30)
+        h1 = float(ppg1_filtered.mean())
+        h2 = float(ppg2_filtered.mean())
+        ppg1_peaks, _ = find_peaks(ppg1_filtered, height=h1, distance=30)
+        ppg2_peaks, _ = find_peaks(ppg2_filtered, height=h2, distance=30)
         
         print(f"Found {len(ppg1_peaks)} peaks in PPG1 and {len(ppg2_peaks)} peaks in PPG2")
         
-        # Calculate PTT for each beat (if enough peaks were detected)
-        ptt_values = []
-        
-        if len(ppg1_peaks) > 0 and len(ppg2_peaks) > 0:
-            # Use the minimum number of peaks from both signals
-            min_peaks = min(len(ppg1_peaks), len(ppg2_peaks))
-            
-            for i in range(min_peaks):
-                # Calculate time difference between corresponding peaks
-                # Assuming first sensor is closer to the heart
-                ptt = abs(timestamps_filtered[ppg2_peaks[i]] - timestamps_filtered[ppg1_peaks[i]])
-                
-                # Only add valid PTT values (positive and reasonable)
-                if 0 < ptt < 300:  # PTT typically less than 300ms
-                    ptt_values.append(ptt)
-            
-            if ptt_values:
+        # Calculate PTT for each beat (if enough peaks were detected).
+        # Corresponding peaks are paired in one vectorized pass, assuming
+        # the first sensor is closer to the heart; only positive PTTs
+        # below 300 ms are kept (PTT is typically less than 300 ms)
+        min_peaks = min(len(ppg1_peaks), len(ppg2_peaks))
+        ptt_values = pair_and_filter(timestamps_filtered, ppg1_peaks, ppg2_peaks)
+
+        if min_peaks > 0:
+            if ptt_values.size > 0:
                 avg_ptt = np.mean(ptt_values)
                 std_ptt = np.std(ptt_values)
                 print(f"Average PTT: {avg_ptt:.2f} ms, STD: {std_ptt:.2f} ms")
                 self.ptt_values = ptt_values
-                self.all_ptt_values.extend(ptt_values)
+                with self._stats_lock:
+                    self.all_ptt_values = np.concatenate((self.all_ptt_values, ptt_values))
+                    self._update_session_stats(ptt_values)
+                    # pair_and_filter guarantees values in 1..299
+                    self._hist += np.bincount(ptt_values, minlength=301)
             else:
                 print("No valid PTT values calculated")
         
@@ -107,10 +245,38 @@ class PTTCalculator:
         
         return ptt_values
 
+    def _update_session_stats(self, ptt_values):
+        """Fold a batch of PTT values into the running accumulators
+        (Welford with Chan's batch merge), O(1) per collection"""
+        k = ptt_values.size
+        if k == 0:
+            return
+        batch_mean = float(np.mean(ptt_values))
+        batch_m2 = float(np.var(ptt_values)) * k
+        delta = batch_mean - self._stat_mean
+        total = self._stat_n + k
+        self._stat_mean += delta * k / total
+        self._stat_m2 += batch_m2 + delta * delta * self._stat_n * k / total
+        self._stat_n = total
+
+    @property
+    def session_mean(self):
+        return self._stat_mean if self._stat_n > 0 else float('nan')
+
+    @property
+    def session_std(self):
+        # Population std, matching np.std over the full array
+        if self._stat_n == 0:
+            return float('nan')
+        return (self._stat_m2 / self._stat_n) ** 0.5
+
     def save_plots(self, timestamps, ppg1, ppg2, ppg1_peaks, ppg2_peaks, ptt_values, filename_base):
         """Create and save plots to the output folder"""
-        # Create a figure with three subplots
-        fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 12))
+        # Reuse the session figure with three fresh subplots
+        fig = self._fig
+        fig.clf()
+        fig.set_size_inches(10, 12)
+        ax1, ax2, ax3 = fig.subplots(3, 1)
         fig.suptitle(f'PTT Analysis - Collection #{self.collection_count}', fontsize=16)
         
         # Plot PPG1 signal and peaks
@@ -131,15 +297,20 @@ class PTTCalculator:
         ax2.set_ylabel('Amplitude')
         ax2.legend()
         
-        # Plot PTT values
-        if ptt_values:
+        # Plot PTT values (each statistic is reduced once and reused in
+        # the labels and the stats text below)
+        if ptt_values.size > 0:
+            mean_ptt = float(np.mean(ptt_values))
+            std_ptt = float(np.std(ptt_values))
+            min_ptt = float(np.min(ptt_values))
+            max_ptt = float(np.max(ptt_values))
             ax3.plot(range(len(ptt_values)), ptt_values, 'g-o', label='Current PTT Values')
-            ax3.axhline(y=np.mean(ptt_values), color='r', linestyle='--', 
-                        label=f'Mean: {np.mean(ptt_values):.2f} ms')
-        if self.all_ptt_values:
+            ax3.axhline(y=mean_ptt, color='r', linestyle='--',
+                        label=f'Mean: {mean_ptt:.2f} ms')
+        if self.all_ptt_values.size > 0:
             # Add a small plot showing all PTT values collected so far
             ax_inset = ax3.inset_axes([0.65, 0.1, 0.3, 0.3])
-            ax_inset.plot(self.all_ptt_values, 'k-', alpha=0.5)
+            ax_inset.plot(_thin(self.all_ptt_values), 'k-', alpha=0.5)
             ax_inset.set_title('All PTT Values')
             ax_inset.set_xlabel('Sample #')
             ax_inset.set_ylabel('PTT (ms)')
@@ -150,58 +321,52 @@ class PTTCalculator:
         ax3.legend()
         
         # Add text with statistics
-        if ptt_values:
+        if ptt_values.size > 0:
             stats_text = (
                 f"Statistics for Collection #{self.collection_count}:\n"
                 f"Number of valid PTT values: {len(ptt_values)}\n"
-                f"Average PTT: {np.mean(ptt_values):.2f} ms\n"
-                f"Standard Deviation: {np.std(ptt_values):.2f} ms\n"
-                f"Min PTT: {min(ptt_values):.2f} ms\n"
-                f"Max PTT: {max(ptt_values):.2f} ms"
+                f"Average PTT: {mean_ptt:.2f} ms\n"
+                f"Standard Deviation: {std_ptt:.2f} ms\n"
+                f"Min PTT: {min_ptt:.2f} ms\n"
+                f"Max PTT: {max_ptt:.2f} ms"
             )
             fig.text(0.1, 0.01, stats_text, fontsize=10)
         
-        plt.tight_layout(rect=[0, 0.05, 1, 0.95])
+        fig.tight_layout(rect=[0, 0.05, 1, 0.95])
         
         # Save the figure
         filename = os.path.join(self.output_folder, f"{filename_base}.png")
-        plt.savefig(filename, dpi=300)
-        plt.close(fig)
+        fig.savefig(filename, dpi=120)
         print(f"Plot saved to: {filename}")
 
     def save_data(self, timestamps, ppg1, ppg2, ptt_values, filename_base):
         """Save the raw data and results to CSV files"""
-        # Save raw PPG data
-        raw_data = pd.DataFrame({
-            'timestamp_ms': timestamps,
-            'ppg1': ppg1,
-            'ppg2': ppg2
-        })
+        # Save raw PPG data as one numeric block via numpy's writer
         raw_filename = os.path.join(self.output_folder, f"{filename_base}_raw_data.csv")
-        raw_data.to_csv(raw_filename, index=False)
-        
+        np.savetxt(raw_filename,
+                   np.column_stack((timestamps, ppg1, ppg2)),
+                   fmt='%d', delimiter=',',
+                   header='timestamp_ms,ppg1,ppg2', comments='')
+
         # Save PTT results if available
-        if ptt_values:
-            ptt_data = pd.DataFrame({
-                'ptt_ms': ptt_values
-            })
-            ptt_data['collection_id'] = self.collection_count
-            ptt_data['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
+        if ptt_values.size > 0:
+            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            rows = [f"{v},{self.collection_count},{now_str}\n" for v in ptt_values]
+
             ptt_filename = os.path.join(self.output_folder, f"{filename_base}_ptt_results.csv")
-            ptt_data.to_csv(ptt_filename, index=False)
-            
-            # Also update a master PTT file with all results
+            with open(ptt_filename, 'w') as f:
+                f.write("ptt_ms,collection_id,timestamp\n")
+                f.writelines(rows)
+
+            # Also append the new rows to the master PTT file; the
+            # header is written once when the file is created, so prior
+            # collections are never re-read or rewritten
             master_filename = os.path.join(self.output_folder, "all_ptt_results.csv")
-            
-            if os.path.exists(master_filename):
-                master_data = pd.read_csv(master_filename)
-                master_data = pd.concat([master_data, ptt_data], ignore_index=True)
-            else:
-                master_data = ptt_data
-                
-            master_data.to_csv(master_filename, index=False)
-            
+            with open(master_filename, 'a') as f:
+                if f.tell() == 0:  # newly created (or empty) file
+                    f.write("ptt_ms,collection_id,timestamp\n")
+                f.writelines(rows)
+
         print(f"Data saved to CSV files in: {self.output_folder}")
     
     def collect_data(self):
@@ -210,38 +375,51 @@ class PTTCalculator:
             print("Arduino not connected")
             return
         
+        # Buffer the port behind an 8 KB reader: one syscall refills
+        # the buffer and readline() then slices lines out of it, instead
+        # of pyserial's per-byte accumulation loop
+        rx = io.BufferedReader(self.ser, 8192)
+
         try:
             print("Starting data collection. Press Ctrl+C to stop...")
             while True:
-                # Read a line from the serial port
-                line = self.ser.readline().decode('utf-8').strip()
-                
+                # Read a raw line from the serial port; it is parsed as
+                # bytes, so no decode on the per-sample path
+                line = rx.readline().strip()
+
                 # Check for start/end markers
-                if line == "START_DATA_COLLECTION":
+                if line == b"START_DATA_COLLECTION":
                     print(f"Starting data collection #{self.collection_count + 1}...")
                     self.is_collecting = True
-                    self.ppg1_data = []
-                    self.ppg2_data = []
-                    self.timestamps = []
+                    self.n = 0
                     continue
-                
-                if line == "END_DATA_COLLECTION":
+
+                if line == b"END_DATA_COLLECTION":
                     print("Data collection complete. Processing data...")
                     self.is_collecting = False
-                    self.process_data()
+                    # Snapshot the filled buffers and hand them to the
+                    # worker so reading resumes immediately; ingest is
+                    # free to overwrite the buffers for the next round
+                    future = self._pool.submit(
+                        self.process_data,
+                        self.timestamps[:self.n].copy(),
+                        self.ppg1_data[:self.n].copy(),
+                        self.ppg2_data[:self.n].copy())
+                    future.add_done_callback(_report_error)
                     continue
-                
-                # Parse data if we're in collection mode
+
+                # Parse data if we're in collection mode; ingest writes
+                # the sample straight into the buffers
                 if self.is_collecting:
-                    try:
-                        parts = line.split(',')
-                        if len(parts) == 3:
-                            timestamp, ppg1, ppg2 = map(int, parts)
-                            self.timestamps.append(timestamp)
-                            self.ppg1_data.append(ppg1)
-                            self.ppg2_data.append(ppg2)
-                    except ValueError:
-                        pass  # Skip invalid data lines
+                    if self.n >= len(self.timestamps):
+                        new_size = 2 * len(self.timestamps)
+                        self.timestamps = np.resize(self.timestamps, new_size)
+                        self.ppg1_data = np.resize(self.ppg1_data, new_size)
+                        self.ppg2_data = np.resize(self.ppg2_data, new_size)
+                    new_n = ingest(line, self.timestamps,
+                                   self.ppg1_data, self.ppg2_data, self.n)
+                    if new_n >= 0:
+                        self.n = new_n
         
         except KeyboardInterrupt:
             print("\nMonitoring stopped by user")
@@ -251,32 +429,49 @@ class PTTCalculator:
             if self.ser:
                 self.ser.close()
                 print("Serial connection closed")
-                
-                # Create a final summary plot if we have data
-                if self.all_ptt_values:
-                    self.create_summary_plot()
+
+            # Let any in-flight processing finish before summarizing;
+            # after the shutdown nothing else touches the accumulators
+            self._pool.shutdown(wait=True)
+
+            # Create a final summary plot if we have data
+            if self.all_ptt_values.size > 0:
+                self.create_summary_plot()
 
     def create_summary_plot(self):
         """Create a summary plot of all PTT data collected during the session"""
-        if not self.all_ptt_values:
+        if self.all_ptt_values.size == 0:
             return
             
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
+        fig = self._fig
+        fig.clf()
+        fig.set_size_inches(10, 8)
+        ax1, ax2 = fig.subplots(2, 1)
         fig.suptitle('PTT Analysis - Session Summary', fontsize=16)
-        
-        # Plot all PTT values
-        ax1.plot(self.all_ptt_values, 'g-', label='All PTT Values')
-        ax1.axhline(y=np.mean(self.all_ptt_values), color='r', linestyle='--', 
-                   label=f'Mean: {np.mean(self.all_ptt_values):.2f} ms')
+
+        # Session mean/std come from the running accumulators; only
+        # min/max still need a pass over the array
+        mean_ptt = self.session_mean
+        std_ptt = self.session_std
+        min_ptt = float(np.min(self.all_ptt_values))
+        max_ptt = float(np.max(self.all_ptt_values))
+
+        # Plot all PTT values (thinned; the histogram below still uses
+        # every measurement)
+        ax1.plot(_thin(self.all_ptt_values), 'g-', label='All PTT Values')
+        ax1.axhline(y=mean_ptt, color='r', linestyle='--',
+                   label=f'Mean: {mean_ptt:.2f} ms')
         ax1.set_title(f'All PTT Values ({len(self.all_ptt_values)} measurements)')
         ax1.set_xlabel('Measurement Number')
         ax1.set_ylabel('PTT (ms)')
         ax1.legend()
         
-        # Plot histogram of PTT values
-        ax2.hist(self.all_ptt_values, bins=20, color='blue', alpha=0.7)
-        ax2.axvline(x=np.mean(self.all_ptt_values), color='r', linestyle='--',
-                   label=f'Mean: {np.mean(self.all_ptt_values):.2f} ms')
+        # Plot histogram of PTT values from the incremental counts,
+        # one bar per millisecond, instead of re-binning the whole array
+        ax2.bar(np.arange(self._hist.size), self._hist, width=1.0,
+                color='blue', alpha=0.7)
+        ax2.axvline(x=mean_ptt, color='r', linestyle='--',
+                   label=f'Mean: {mean_ptt:.2f} ms')
         ax2.set_title('PTT Distribution')
         ax2.set_xlabel('PTT (ms)')
         ax2.set_ylabel('Frequency')
@@ -287,20 +482,19 @@ class PTTCalculator:
             f"Session Summary Statistics:\n"
             f"Total Collections: {self.collection_count}\n"
             f"Total PTT Measurements: {len(self.all_ptt_values)}\n"
-            f"Average PTT: {np.mean(self.all_ptt_values):.2f} ms\n"
-            f"Standard Deviation: {np.std(self.all_ptt_values):.2f} ms\n"
-            f"Min PTT: {min(self.all_ptt_values):.2f} ms\n"
-            f"Max PTT: {max(self.all_ptt_values):.2f} ms"
+            f"Average PTT: {mean_ptt:.2f} ms\n"
+            f"Standard Deviation: {std_ptt:.2f} ms\n"
+            f"Min PTT: {min_ptt:.2f} ms\n"
+            f"Max PTT: {max_ptt:.2f} ms"
         )
         fig.text(0.1, 0.01, stats_text, fontsize=10)
         
-        plt.tight_layout(rect=[0, 0.07, 1, 0.95])
+        fig.tight_layout(rect=[0, 0.07, 1, 0.95])
         
         # Save the summary figure
         timestamp_str = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = os.path.join(self.output_folder, f"session_summary_{timestamp_str}.png")
-        plt.savefig(filename, dpi=300)
-        plt.close(fig)
+        fig.savefig(filename, dpi=120)
         print(f"Session summary plot saved to: {filename}")
 
     def run(self):